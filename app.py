@@ -1,15 +1,63 @@
 import os
-import json
 import re
 from collections import Counter
+from functools import lru_cache
+import numpy as np
 import streamlit as st
+import torch
 
 from smart_triage import SmartIssueTriage
 
+# The app only runs inference; skip autograd for every tensor op
+torch.set_grad_enabled(False)
+
 
 @st.cache_resource(show_spinner=False)
 def load_triage(model_dir: str = 'model_artifacts') -> SmartIssueTriage:
-    return SmartIssueTriage(model_dir=model_dir)
+    # Use the quantized ONNX encoder when it has been exported next to the artifacts
+    bert_onnx_dir = os.path.join(model_dir, 'minilm-onnx')
+    triage = SmartIssueTriage(
+        model_dir=model_dir,
+        bert_onnx_dir=bert_onnx_dir if os.path.isdir(bert_onnx_dir) else None
+    )
+
+    # Warm up once per process (this function is a cached resource) so the first
+    # user's request doesn't pay for lazy initialization and the first forward pass
+    try:
+        triage.predict(title='warmup', body='warmup', repo=triage.repo_options[0])
+    except Exception:
+        pass
+    return triage
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_predict(title: str, body: str, repo: str) -> dict:
+    # Streamlit reruns the script on every interaction; only recompute when the inputs change
+    return load_triage().predict(title=title, body=body, repo=repo)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def top_terms(combined_text: str, k: int = 5):
+    """Return (tokens, (token, weight) pairs) for the top-k TF-IDF n-grams in the text."""
+    triage = load_triage()
+    vec = triage.tfidf_vectorizer
+    # Work on the sparse row directly: only the few non-zero n-grams are ranked
+    Xv = vec.transform([combined_text])
+    Xv.sort_indices()
+    order = np.argsort(-Xv.data, kind='stable')[:k]
+    top_idxs = Xv.indices[order]
+    top_weights = Xv.data[order]
+    top_tokens = triage.tfidf_feature_names[top_idxs].tolist()
+    top_pairs = list(zip(top_tokens, top_weights.tolist()))
+
+    # Fallback: if no TF-IDF overlap, pick top k tokens by frequency using vectorizer analyzer
+    if not top_tokens:
+        counts = Counter(t for t in triage.tfidf_analyzer(combined_text) if len(t) >= 3)
+        most_common = [tok for tok, _ in counts.most_common(k)]
+        top_tokens = most_common
+        top_pairs = [(tok, float(counts[tok])) for tok in most_common]
+
+    return top_tokens, top_pairs
 
 
 def format_tags(pred: dict, min_conf: float = 0.30):
@@ -30,6 +78,69 @@ def format_tags(pred: dict, min_conf: float = 0.30):
     return tags[:3]
 
 
+@lru_cache(maxsize=64)
+def highlight_pattern(tokens: tuple):
+    # One alternation, longest token first so n-grams win over their own words
+    alternation = '|'.join(re.escape(tok) for tok in sorted(tokens, key=len, reverse=True))
+    return re.compile(rf'\b(?:{alternation})\b', flags=re.IGNORECASE)
+
+
+def highlight_html(text: str, tokens):
+    tokens = tuple(sorted(tok for tok in tokens if tok))
+    if not tokens:
+        return text
+    return highlight_pattern(tokens).sub(lambda m: f"<span class='hl'>{m.group(0)}</span>", text)
+
+
+# st.fragment needs Streamlit >= 1.37; older versions just rerun the whole page
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+
+def toggle_tag(tag: str):
+    selected = st.session_state['selected_tags']
+    if tag in selected:
+        selected.discard(tag)
+    else:
+        selected.add(tag)
+
+
+@fragment
+def render_tag_buttons(tags):
+    # Runs as a fragment: clicking a tag only reruns this function, not predict or the highlight preview
+    st.success('Suggested tags:')
+    selected = st.session_state['selected_tags']
+
+    # Per-column button opacity and selected border, emitted as one <style> block
+    # targeting the i-th column's button via nth-child
+    rules = []
+    for i, t in enumerate(tags):
+        conf = float(t.get('confidence', 0))
+        is_selected = t.get('tag', '') in selected
+        opacity = 1.0 if is_selected else max(0.25, min(1.0, conf))
+        border = '#16a34a' if is_selected else 'rgba(0,0,0,0.15)'
+        rules.append(
+            f'div[data-testid="column"]:nth-child({i+1}) button '
+            f'{{ opacity: {opacity} !important; border-color: {border} !important; }}'
+        )
+    if rules:
+        st.markdown(f"<style>{''.join(rules)}</style>", unsafe_allow_html=True)
+
+    cols = st.columns(len(tags) if tags else 1)
+    for i, t in enumerate(tags):
+        tag = t.get('tag', '')
+        conf = float(t.get('confidence', 0))
+        is_selected = tag in selected
+        with cols[i]:
+            label = f"{tag} — {conf*100:.0f}%"
+            # Toggle in a callback so the fragment rerun already renders the new selection
+            st.button(
+                label if not is_selected else f"✅ {label}",
+                key=f"tag_btn_{i}",
+                on_click=toggle_tag,
+                args=(tag,),
+            )
+
+
 def main():
     st.set_page_config(page_title='Smart Issue Triage – Tag Suggester', page_icon='🧠', layout='centered')
     st.title('💡 Smart Issue Triage')
@@ -54,9 +165,7 @@ def main():
     )
 
     triage = load_triage()
-    repo_options = sorted([str(r) for r in getattr(triage.repo_encoder, 'classes_', [])])
-    if not repo_options:
-        repo_options = ['unknown_repo']
+    repo_options = triage.repo_options
 
     # Handle reset BEFORE rendering widgets: clear inputs and state to defaults
     if st.session_state.get('do_reset'):
@@ -82,7 +191,7 @@ def main():
             st.warning('Please enter a title or description.')
         else:
             try:
-                st.session_state['last_pred'] = triage.predict(title=title, body=body, repo=repo)
+                st.session_state['last_pred'] = cached_predict(title, body, repo)
             except Exception as e:
                 st.error(f'Prediction failed: {e}')
 
@@ -111,32 +220,7 @@ def main():
         combined_text = f"{title_val}\n{body_val}"
         top_pairs = []
         try:
-            vec = triage.tfidf_vectorizer
-            Xv = vec.transform([combined_text])
-            weights = Xv.toarray()[0]
-            feature_names = getattr(vec, 'get_feature_names_out', vec.get_feature_names)()
-            present_idxs = [i for i, w in enumerate(weights) if w > 0]
-            top_idxs = sorted(present_idxs, key=lambda i: weights[i], reverse=True)[:5]
-            top_tokens = [feature_names[i] for i in top_idxs]
-            top_pairs = [(feature_names[i], float(weights[i])) for i in top_idxs]
-
-            # Fallback: if no TF-IDF overlap, pick top 5 tokens by frequency using vectorizer analyzer
-            if not top_tokens:
-                analyzer = vec.build_analyzer()
-                toks = [t for t in analyzer(combined_text) if len(t) >= 3]
-                counts = Counter(toks)
-                most_common = [tok for tok, _ in counts.most_common(5)]
-                top_tokens = most_common
-                top_pairs = [(tok, float(counts[tok])) for tok in most_common]
-
-            def highlight_html(text: str, tokens):
-                html = text
-                for tok in sorted(tokens, key=lambda t: len(t), reverse=True):
-                    if not tok:
-                        continue
-                    pattern = re.compile(re.escape(tok), flags=re.IGNORECASE)
-                    html = pattern.sub(lambda m: f"<span class='hl'>{m.group(0)}</span>", html)
-                return html
+            top_tokens, top_pairs = top_terms(combined_text)
 
             if any(top_tokens):
                 st.caption('Top terms highlighted in your input')
@@ -150,35 +234,7 @@ def main():
         except Exception:
             pass
 
-        st.success('Suggested tags:')
-        cols = st.columns(len(tags) if tags else 1)
-        # Add per-column button opacity styling using nth-child targeting
-        for i, t in enumerate(tags):
-            tag = t.get('tag', '')
-            conf = float(t.get('confidence', 0))
-            opacity = max(0.25, min(1.0, conf))
-            is_selected = tag in st.session_state['selected_tags']
-
-            # Target the i-th column's button to set opacity and selected border
-            st.markdown(
-                f"""
-                <style>
-                div[data-testid="column"]:nth-child({i+1}) button {{
-                    opacity: {1.0 if is_selected else opacity} !important;
-                    border-color: {'#16a34a' if is_selected else 'rgba(0,0,0,0.15)'} !important;
-                }}
-                </style>
-                """,
-                unsafe_allow_html=True,
-            )
-
-            with cols[i]:
-                label = f"{tag} — {conf*100:.0f}%"
-                if st.button(label if not is_selected else f"✅ {label}", key=f"tag_btn_{i}"):
-                    if is_selected:
-                        st.session_state['selected_tags'].discard(tag)
-                    else:
-                        st.session_state['selected_tags'].add(tag)
+        render_tag_buttons(tags)
 
         with st.expander('Details'):
             st.markdown('Top 5 terms influencing suggestions (TF-IDF weight or frequency fallback):')
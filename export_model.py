@@ -1,18 +1,19 @@
 """
 Export trained model and artifacts for production use.
 """
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import LabelEncoder
 from sentence_transformers import SentenceTransformer
 import xgboost as xgb
-from model_utils import save_model_artifacts
+from model_utils import save_model_artifacts, select_xgboost_device
 
 # Load the processed data
 df = pd.read_csv('github_issues_processed.csv')
 
-# Initialize and fit TF-IDF vectorizer
-tfidf = TfidfVectorizer(max_features=250, stop_words='english', ngram_range=(1,2))
+# Initialize and fit TF-IDF vectorizer (float32 idf_ and output, matching the model's float32 inputs)
+tfidf = TfidfVectorizer(max_features=250, stop_words='english', ngram_range=(1,2), dtype=np.float32)
 combined_text = df[['title', 'body']].fillna('').apply(lambda x: ' '.join(x), axis=1)
 tfidf.fit(combined_text)
 
@@ -24,7 +25,8 @@ le.fit(df['category'])
 repo_encoder = LabelEncoder()
 repo_encoder.fit(df['repo_name'])
 
-# Configure XGBoost
+# Configure XGBoost (histogram trees, on GPU when available)
+device = select_xgboost_device()
 xgb_config = {
     'n_estimators': 200,
     'learning_rate': 0.1,
@@ -33,10 +35,14 @@ xgb_config = {
     'subsample': 0.8,
     'colsample_bytree': 0.8,
     'random_state': 42,
-    'n_jobs': -1,
+    'tree_method': 'hist',
+    'max_bin': 256,
+    'device': device,
     'objective': 'multi:softprob',
     'num_class': len(le.classes_)
 }
+if device == 'cpu':
+    xgb_config['n_jobs'] = -1
 
 # Create and train XGBoost model
 model = xgb.XGBClassifier(**xgb_config)
@@ -1,20 +1,87 @@
 """
 Feature engineering utilities for text processing and embeddings.
 """
-import pandas as pd
+import os
+import re
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
+class OnnxSentenceEncoder:
+    def __init__(self, model_dir, file_name='model_quantized.onnx', max_length=256):
+        """
+        Sentence encoder backed by an ONNX export of all-MiniLM-L6-v2.
+        
+        Produces the same mean-pooled, L2-normalized embeddings as
+        SentenceTransformer.encode. Export and quantize the model next to the
+        other artifacts (the app picks it up from model_artifacts/minilm-onnx/):
+        
+            optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 --optimize O3 model_artifacts/minilm-onnx/
+            optimum-cli onnxruntime quantize --onnx_model model_artifacts/minilm-onnx/ --avx512_vnni -o model_artifacts/minilm-onnx/
+        
+        Args:
+            model_dir: Directory containing the ONNX model and tokenizer files
+            file_name: ONNX model file inside model_dir
+            max_length: Maximum number of tokens per text (the model's max_seq_length)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = max_length
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, file_name),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+    
+    def encode(self, sentences, convert_to_numpy=True):
+        """
+        Encode texts into normalized sentence embeddings
+        
+        Args:
+            sentences: List of texts
+            convert_to_numpy: Kept for SentenceTransformer compatibility; output is always numpy
+            
+        Returns:
+            np.ndarray: Embeddings of shape (len(sentences), 384)
+        """
+        encoded = self.tokenizer(
+            sentences,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors='np'
+        )
+        feed = {name: value for name, value in encoded.items() if name in self._input_names}
+        token_embeddings = self.session.run(None, feed)[0]
+        
+        # Mean pooling over real tokens, then L2 normalization
+        mask = encoded['attention_mask'][..., None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
 class TextFeatureExtractor:
-    def __init__(self, tfidf_vectorizer, bert_model_name='all-MiniLM-L6-v2'):
+    def __init__(self, tfidf_vectorizer, bert_model_name='all-MiniLM-L6-v2', bert_onnx_dir=None):
         """
         Initialize text feature extractor
         
         Args:
             tfidf_vectorizer: Pre-trained TF-IDF vectorizer
             bert_model_name: Name of the BERT model to use
+            bert_onnx_dir: Optional directory with an ONNX export of the BERT model;
+                when given, embeddings are computed with onnxruntime instead of PyTorch
         """
         self.tfidf_vectorizer = tfidf_vectorizer
-        self.bert_model = SentenceTransformer(bert_model_name)
+        if bert_onnx_dir:
+            self.bert_model = OnnxSentenceEncoder(bert_onnx_dir)
+        else:
+            self.bert_model = SentenceTransformer(bert_model_name)
         
         # Define the exact order of features expected by the trained model
         # IMPORTANT: This must match the DataFrame columns used during training exactly
@@ -51,8 +118,69 @@ class TextFeatureExtractor:
         
         # Add BERT feature names (384 features as in training)
         self.feature_order.extend([f'bert_{i}' for i in range(384)])
+
+        # Column positions, so features can be written straight into a preallocated row
+        self._idx = {name: i for i, name in enumerate(self.feature_order)}
+        self._TFIDF_SLICE = slice(self._idx['tfidf_0'], self._idx['tfidf_249'] + 1)
+        self._BERT_SLICE = slice(self._idx['bert_0'], self._idx['bert_383'] + 1)
+        self._basic_cols = np.array([self._idx[name] for name in [
+            'title_length',
+            'body_length',
+            'title_word_count',
+            'body_word_count',
+            'code_block_count',
+            'url_count',
+            'title_question_word_count',
+            'title_has_question_mark',
+            'body_question_word_count',
+            'body_has_question_mark',
+            'total_question_word_count',
+            'total_has_question_mark',
+            'includes_questions',
+            'title_n_urgent_words',
+            'title_has_exclamation',
+            'body_n_urgent_words',
+            'body_has_exclamation',
+            'total_n_urgent_words',
+            'total_has_exclamation',
+            'urgency_score'
+        ]])
+        
+        # Keyword alternations, counted the same way as in training
+        # (non-overlapping matches of 'how|what|...' on the text)
+        question_words = ['how', 'what', 'why', 'when', 'where', 'which', 'who']
+        urgent_words = ['urgent', 'critical', 'asap', 'immediate', 'emergency', 
+                       'broken', 'error', 'serious', 'security']
+        # Applied to lowercased text, as in training
+        self._question_re = re.compile('|'.join(question_words))
+        self._urgent_re = re.compile('|'.join(urgent_words))
+        
+        # Repository -> code mapping, built on first use from the repo encoder
+        self._repo_encoder = None
+        self._repo_to_code = {}
         
-    def extract_basic_features(self, text, title, body):
+    def _text_stats(self, text, text_lower):
+        """
+        Compute the per-string statistics shared by title and body
+        
+        Args:
+            text: Title or body text
+            text_lower: The same text, lowercased
+            
+        Returns:
+            tuple: (length, word_count, has_question_mark, has_exclamation,
+                    question_word_count, n_urgent_words)
+        """
+        return (
+            len(text),
+            len(text.split()),
+            int('?' in text),
+            int('!' in text),
+            len(self._question_re.findall(text_lower)),
+            len(self._urgent_re.findall(text_lower))
+        )
+    
+    def extract_basic_features(self, text, title, body, out):
         """
         Extract basic text features
         
@@ -60,94 +188,101 @@ class TextFeatureExtractor:
             text: Combined text
             title: Issue title
             body: Issue body
-            
-        Returns:
-            dict: Basic text features
+            out: Preallocated feature row to write into
         """
-        features = {}
-        
-        # Initialize all features to 0
-        for feature in self.feature_order:
-            features[feature] = 0
-        
-        # Title features
-        features['title_length'] = len(title)
-        features['title_word_count'] = len(title.split())
-        features['title_has_question_mark'] = int('?' in title)
-        features['title_has_exclamation'] = int('!' in title)
+        # Lowercase each string once; keyword and URL counts all scan these copies
+        title_lower = title.lower()
+        body_lower = body.lower()
         
-        # Body features
-        features['body_length'] = len(body)
-        features['body_word_count'] = len(body.split())
-        features['body_has_question_mark'] = int('?' in body)
-        features['body_has_exclamation'] = int('!' in body)
-        
-        # Code block features
-        features['code_block_count'] = body.count('```') // 2
-        
-        # URL features
-        features['url_count'] = body.lower().count('http')
+        (title_length, title_word_count, title_has_question_mark, title_has_exclamation,
+         title_question_word_count, title_n_urgent_words) = self._text_stats(title, title_lower)
+        (body_length, body_word_count, body_has_question_mark, body_has_exclamation,
+         body_question_word_count, body_n_urgent_words) = self._text_stats(body, body_lower)
         
         # Question indicators
-        question_words = ['how', 'what', 'why', 'when', 'where', 'which', 'who']
-        features['title_question_word_count'] = sum(title.lower().count(word) for word in question_words)
-        features['body_question_word_count'] = sum(body.lower().count(word) for word in question_words)
-        features['total_question_word_count'] = features['title_question_word_count'] + features['body_question_word_count']
-        features['total_has_question_mark'] = features['title_has_question_mark'] + features['body_has_question_mark']
-        features['includes_questions'] = int((features['total_question_word_count'] > 0) or (features['total_has_question_mark'] > 0))
+        total_question_word_count = title_question_word_count + body_question_word_count
+        total_has_question_mark = title_has_question_mark + body_has_question_mark
         
         # Urgency indicators
-        urgent_words = ['urgent', 'critical', 'asap', 'immediate', 'emergency', 
-                       'broken', 'error', 'serious', 'security']
-        features['title_n_urgent_words'] = sum(title.lower().count(word) for word in urgent_words)
-        features['body_n_urgent_words'] = sum(body.lower().count(word) for word in urgent_words)
-        features['total_n_urgent_words'] = features['title_n_urgent_words'] + features['body_n_urgent_words']
-        features['total_has_exclamation'] = features['title_has_exclamation'] + features['body_has_exclamation']
-        features['urgency_score'] = features['total_n_urgent_words'] + features['total_has_exclamation']
+        total_n_urgent_words = title_n_urgent_words + body_n_urgent_words
+        total_has_exclamation = title_has_exclamation + body_has_exclamation
         
-        return features
+        # Scatter every basic feature in one assignment, in self._basic_cols order
+        out[self._basic_cols] = (
+            title_length,
+            body_length,
+            title_word_count,
+            body_word_count,
+            body.count('```') // 2,              # code_block_count
+            body_lower.count('http'),            # url_count
+            title_question_word_count,
+            title_has_question_mark,
+            body_question_word_count,
+            body_has_question_mark,
+            total_question_word_count,
+            total_has_question_mark,
+            int((total_question_word_count > 0) or (total_has_question_mark > 0)),
+            title_n_urgent_words,
+            title_has_exclamation,
+            body_n_urgent_words,
+            body_has_exclamation,
+            total_n_urgent_words,
+            total_has_exclamation,
+            total_n_urgent_words + total_has_exclamation   # urgency_score
+        )
     
-    def extract_tfidf_features(self, text):
+    def extract_tfidf_features(self, text, out):
         """
         Extract TF-IDF features
         
         Args:
             text: Input text
-            
-        Returns:
-            dict: TF-IDF features
+            out: Preallocated feature row to write into
         """
+        # Scatter the sparse row directly; every other TF-IDF column stays 0
         tfidf_features = self.tfidf_vectorizer.transform([text])
-        features = {}
-        for i in range(250):
-            feature_name = f'tfidf_{i}'
-            features[feature_name] = tfidf_features[0, i] if i < tfidf_features.shape[1] else 0
-        return features
+        cols = tfidf_features.indices
+        keep = cols < 250
+        out[self._TFIDF_SLICE.start + cols[keep]] = tfidf_features.data[keep]
     
-    def extract_bert_features(self, text):
+    def extract_bert_features(self, text, out):
         """
         Extract BERT embeddings
         
         Args:
             text: Input text
+            out: Preallocated feature row to write into
+        """
+        # No autograd bookkeeping for the transformer forward pass
+        with torch.inference_mode():
+            bert_embedding = self.bert_model.encode([text], convert_to_numpy=True)
+        # Support both (1, 384) and (384,) shapes
+        bert_embedding = np.asarray(bert_embedding).reshape(-1)[:384]
+        out[self._BERT_SLICE.start:self._BERT_SLICE.start + len(bert_embedding)] = bert_embedding
+    
+    def encode_repo(self, repo, repo_encoder):
+        """
+        Encode a repository name with a dict lookup instead of LabelEncoder.transform
+        
+        Args:
+            repo: Repository name
+            repo_encoder: Fitted LabelEncoder for repositories
             
         Returns:
-            dict: BERT features
+            int: Encoded repository, or -1 if the repository was not seen in training
         """
-        bert_embedding = self.bert_model.encode([text])
-        features = {}
-        # Support both (1, 384) and (384,) shapes
-        if hasattr(bert_embedding, 'shape') and len(bert_embedding.shape) == 2:
-            for i in range(384):
-                feature_name = f'bert_{i}'
-                features[feature_name] = bert_embedding[0, i] if i < bert_embedding.shape[1] else 0
-        else:
-            for i in range(384):
-                feature_name = f'bert_{i}'
-                features[feature_name] = bert_embedding[i] if i < len(bert_embedding) else 0
-        return features
+        if repo_encoder is not self._repo_encoder:
+            self._repo_to_code = {name: code for code, name in enumerate(repo_encoder.classes_)}
+            self._repo_encoder = repo_encoder
+        return self._repo_to_code.get(repo, -1)
     
-    def extract_all_features(self, text, repo, repo_encoder):
+    @staticmethod
+    def split_text(text):
+        """Split combined text into (title, body) on the first newline."""
+        parts = text.split('\n', 1)
+        return parts[0], parts[1] if len(parts) > 1 else ''
+    
+    def extract_all_features(self, text, repo, repo_encoder, title=None, body=None):
         """
         Extract all features for a given text
         
@@ -155,31 +290,71 @@ class TextFeatureExtractor:
             text: Input text
             repo: Repository name
             repo_encoder: Fitted LabelEncoder for repositories
+            title: Issue title, if already known (avoids re-splitting text)
+            body: Issue body, if already known (avoids re-splitting text)
             
         Returns:
-            pd.DataFrame: All extracted features
+            np.ndarray: All extracted features, shape (1, len(feature_order))
         """
-        # Split text into title and body
-        parts = text.split('\n', 1)
-        title = parts[0]
-        body = parts[1] if len(parts) > 1 else ''
+        # Split text into title and body unless the caller already has them
+        if title is None or body is None:
+            title, body = self.split_text(text)
         
-        # Extract all features
-        features = {}
+        # Extract all features into a single row, in feature_order
+        out = np.zeros(len(self.feature_order), dtype=np.float32)
         
         # Get basic features
-        features.update(self.extract_basic_features(text, title, body))
+        self.extract_basic_features(text, title, body, out)
         
         # Add repository encoding
-        features['repo_encoded'] = repo_encoder.transform([repo])[0]
+        out[self._idx['repo_encoded']] = self.encode_repo(repo, repo_encoder)
         
         # Get TF-IDF features
-        features.update(self.extract_tfidf_features(text))
+        self.extract_tfidf_features(text, out)
         
         # Get BERT features
-        features.update(self.extract_bert_features(text))
+        self.extract_bert_features(text, out)
+        
+        # Columns are already in feature_order, so the model can take the raw row
+        return out[None, :]
+    
+    def extract_all_features_batch(self, texts, repos, repo_encoder, titles=None, bodies=None):
+        """
+        Extract all features for many texts at once
+        
+        TF-IDF and BERT run once over the whole batch instead of once per text.
+        
+        Args:
+            texts: List of input texts
+            repos: Repository name for each text
+            repo_encoder: Fitted LabelEncoder for repositories
+            titles: Issue titles, if already known (avoids re-splitting texts)
+            bodies: Issue bodies, if already known (avoids re-splitting texts)
+            
+        Returns:
+            np.ndarray: All extracted features, shape (len(texts), len(feature_order))
+        """
+        out = np.zeros((len(texts), len(self.feature_order)), dtype=np.float32)
+        if not texts:
+            return out
+        
+        # Get basic features and repository encoding, row by row
+        repo_col = self._idx['repo_encoded']
+        if titles is None or bodies is None:
+            titles, bodies = zip(*map(self.split_text, texts))
+        for row, text, title, body, repo in zip(out, texts, titles, bodies, repos):
+            self.extract_basic_features(text, title, body, row)
+            row[repo_col] = self.encode_repo(repo, repo_encoder)
+        
+        # Get TF-IDF features: one transform, scattered by (row, column)
+        tfidf_features = self.tfidf_vectorizer.transform(texts).tocoo()
+        keep = tfidf_features.col < 250
+        out[tfidf_features.row[keep], self._TFIDF_SLICE.start + tfidf_features.col[keep]] = tfidf_features.data[keep]
         
-        # Create DataFrame with exact feature order
-        df = pd.DataFrame([features])[self.feature_order]
+        # Get BERT features: one batched encode
+        with torch.inference_mode():
+            bert_embeddings = self.bert_model.encode(texts, convert_to_numpy=True)
+        bert_embeddings = np.asarray(bert_embeddings).reshape(len(texts), -1)[:, :384]
+        out[:, self._BERT_SLICE.start:self._BERT_SLICE.start + bert_embeddings.shape[1]] = bert_embeddings
         
-        return df
\ No newline at end of file
+        return out
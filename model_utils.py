@@ -2,32 +2,57 @@
 Utility functions for model persistence and loading.
 """
 import os
+import pickle
 import joblib
+import xgboost as xgb
 from sklearn.calibration import CalibratedClassifierCV
 
-def save_model_artifacts(model, tfidf_vectorizer, label_encoder, repo_encoder, output_dir):
+def save_model_artifacts(model, tfidf_vectorizer, label_encoder, repo_encoder, output_dir,
+                         compress=('lz4', 3)):
     """
     Save all model artifacts needed for prediction
     
+    The XGBoost model is written in its native format (model.ubj), which
+    loads faster than a pickle and is portable across XGBoost versions.
+    The remaining artifacts are LZ4-compressed joblib pickles.
+    
     Args:
         model: Trained XGBoost model
         tfidf_vectorizer: Fitted TF-IDF vectorizer
         label_encoder: Fitted LabelEncoder for categories
         repo_encoder: Fitted LabelEncoder for repositories
         output_dir: Directory to save artifacts
+        compress: joblib compression setting for the pickled artifacts
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         
     artifacts = {
-        'model': model,
         'tfidf_vectorizer': tfidf_vectorizer,
         'label_encoder': label_encoder,
         'repo_encoder': repo_encoder
     }
     
+    if isinstance(model, xgb.XGBModel):
+        model.save_model(os.path.join(output_dir, 'model.ubj'))
+        # Drop any stale pickle so it cannot shadow the native model
+        stale = os.path.join(output_dir, 'model.joblib')
+        if os.path.exists(stale):
+            os.remove(stale)
+    else:
+        artifacts['model'] = model
+        # Likewise drop a native model left over from an earlier save; it would win on load
+        stale = os.path.join(output_dir, 'model.ubj')
+        if os.path.exists(stale):
+            os.remove(stale)
+    
     for name, artifact in artifacts.items():
-        joblib.dump(artifact, os.path.join(output_dir, f'{name}.joblib'))
+        joblib.dump(
+            artifact,
+            os.path.join(output_dir, f'{name}.joblib'),
+            compress=compress,
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
 
 def load_model_artifacts(model_dir):
     """
@@ -43,7 +68,16 @@ def load_model_artifacts(model_dir):
         raise ValueError(f"Model directory {model_dir} does not exist")
         
     artifacts = {}
-    required_files = ['model', 'tfidf_vectorizer', 'label_encoder', 'repo_encoder']
+    required_files = ['tfidf_vectorizer', 'label_encoder', 'repo_encoder']
+    
+    # Prefer the native XGBoost model; fall back to a pickled one
+    native_model_path = os.path.join(model_dir, 'model.ubj')
+    if os.path.exists(native_model_path):
+        model = xgb.XGBClassifier()
+        model.load_model(native_model_path)
+        artifacts['model'] = model
+    else:
+        required_files.insert(0, 'model')
     
     for name in required_files:
         file_path = os.path.join(model_dir, f'{name}.joblib')
@@ -72,3 +106,18 @@ def calibrate_xgboost_model(xgb_model, X_val, y_val):
     )
     calibrated_model.fit(X_val, y_val)
     return calibrated_model
+
+def select_xgboost_device():
+    """
+    Pick the XGBoost training device
+    
+    Returns:
+        str: 'cuda' if XGBoost was built with CUDA and a GPU is visible, else 'cpu'
+    """
+    if not xgb.build_info().get('USE_CUDA', False):
+        return 'cpu'
+    try:
+        import torch
+        return 'cuda' if torch.cuda.is_available() else 'cpu'
+    except ImportError:
+        return 'cpu'
@@ -1,20 +1,39 @@
 """
 Smart issue triage: returns up to 3 category tags with confidence scores.
 """
-from typing import Dict, List, Optional, Union
-import pandas as pd
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
 import numpy as np
+import xgboost as xgb
+from joblib import Parallel, delayed
 
 from model_utils import load_model_artifacts
 from feature_engineering import TextFeatureExtractor
 
+# {'suggested_tags': [{'tag': str, 'confidence': float}, ...]}
+Prediction = Dict[str, List[Dict[str, Union[str, float]]]]
+
+def _xgb_models(model: Any) -> List[xgb.XGBModel]:
+    """XGBoost models making up model: the model itself, or those a calibrator wraps."""
+    wrapped = [c.estimator for c in getattr(model, 'calibrated_classifiers_', [])] or [model]
+    found = []
+    for estimator in wrapped:
+        # Unwrap FrozenEstimator and similar meta-estimators
+        while not isinstance(estimator, xgb.XGBModel) and hasattr(estimator, 'estimator'):
+            estimator = estimator.estimator
+        if isinstance(estimator, xgb.XGBModel):
+            found.append(estimator)
+    return found
+
 class SmartIssueTriage:
-    def __init__(self, model_dir: str):
+    def __init__(self, model_dir: str, bert_onnx_dir: Optional[str] = None) -> None:
         """
         Initialize the smart issue triage system
         
         Args:
             model_dir: Directory containing saved model artifacts
+            bert_onnx_dir: Optional directory with an ONNX export of the BERT model
         """
         # Load artifacts
         self.artifacts = load_model_artifacts(model_dir)
@@ -23,60 +42,207 @@ class SmartIssueTriage:
         self.label_encoder = self.artifacts['label_encoder']
         self.repo_encoder = self.artifacts['repo_encoder']
         
+        # Low-level booster for batch scoring; honour early stopping like predict_proba does.
+        # Other models (e.g. a calibrated XGBoost model) keep going through predict_proba
+        self._booster = None
+        self._iteration_range = (0, 0)
+        if isinstance(self.model, xgb.XGBModel):
+            self._booster = self.model.get_booster()
+            try:
+                self._iteration_range = (0, self.model.best_iteration + 1)
+            except AttributeError:
+                pass
+        
+        # Rows are built in feature_order, so skip XGBoost's column-name check. A plain
+        # XGBoost model takes validate_features=False per call and is left untouched;
+        # a calibrator can't forward that flag, so the boosters it wraps lose their
+        # column names instead (re-saving such a model saves them without names)
+        self._predict_kwargs: Dict[str, Any] = {}
+        if isinstance(self.model, xgb.XGBModel):
+            self._predict_kwargs['validate_features'] = False
+        else:
+            for xgb_model in _xgb_models(self.model):
+                xgb_model.get_booster().feature_names = None
+        
+        # Decoded category labels in predict_proba column order
+        self._classes = np.asarray(self.label_encoder.classes_)
+        
         # Initialize feature extractor
-        self.feature_extractor = TextFeatureExtractor(self.tfidf_vectorizer)
+        self.feature_extractor = TextFeatureExtractor(
+            self.tfidf_vectorizer,
+            bert_onnx_dir=bert_onnx_dir
+        )
+        
+        # Duplicate issues ("me too" reports, repeated crash dumps) skip feature
+        # extraction entirely; keyed on (title, body, repo), cached rows are read-only.
+        # Keys hold the full texts, so memory is bounded by 4096 x (issue size + 2.6 KB row)
+        self._cached_features = lru_cache(maxsize=4096)(self._extract_features)
+        
+        # Pure functions of the loaded artifacts, computed once for the UI
+        self.repo_options = sorted(str(r) for r in getattr(self.repo_encoder, 'classes_', [])) or ['unknown_repo']
+        self.tfidf_analyzer = self.tfidf_vectorizer.build_analyzer()
+        if hasattr(self.tfidf_vectorizer, 'get_feature_names_out'):
+            self.tfidf_feature_names = np.asarray(self.tfidf_vectorizer.get_feature_names_out())
+        else:
+            self.tfidf_feature_names = np.asarray(self.tfidf_vectorizer.get_feature_names())
         
         # No opinionated thresholds here; UI controls the minimum confidence
     
     def get_recommendations(
         self,
-        features: pd.DataFrame,
+        features: np.ndarray,
         threshold: float = 0.30
-    ) -> Dict:
+    ) -> Prediction:
         """
         Return up to 3 suggested category tags with confidence.
         """
-        proba = self.model.predict_proba(features)[0]
-        classes = self.label_encoder.inverse_transform(range(len(proba)))
-        ranked = sorted(zip(classes, proba), key=lambda x: x[1], reverse=True)
+        probas = self.model.predict_proba(features, **self._predict_kwargs)
+        return self._build_result(probas[0], self._top_k(probas)[0], threshold=threshold)
+    
+    @staticmethod
+    def _top_k(probas: np.ndarray, k: int = 3) -> np.ndarray:
+        """
+        Indices of the k most likely classes for every row, highest first.
+        
+        Partitions out the top k per row and only sorts those, vectorized over
+        the whole (N, K) probability matrix.
+        """
+        k = min(k, probas.shape[1])
+        top_idx = np.argpartition(probas, -k, axis=1)[:, -k:]
+        order = np.argsort(np.take_along_axis(probas, top_idx, axis=1), axis=1)[:, ::-1]
+        return np.take_along_axis(top_idx, order, axis=1)
+    
+    def _build_result(
+        self,
+        proba: np.ndarray,
+        top_idx: np.ndarray,
+        threshold: float = 0.30
+    ) -> Prediction:
+        """Turn one row of class probabilities and its top-k indices into the suggested-tags result."""
         # Always return top 3; UI decides what to display based on threshold
-        suggestions = [
-            {'tag': cat, 'confidence': float(conf)}
-            for cat, conf in ranked[:3]
+        # Stay on integer class ids until here; decode all selected labels at once
+        tags = self._classes[top_idx].tolist()
+        confidences = proba[top_idx].tolist()
+        suggestions: List[Dict[str, Union[str, float]]] = [
+            {'tag': tag, 'confidence': conf}
+            for tag, conf in zip(tags, confidences)
         ]
         return {'suggested_tags': suggestions}
     
+    def _predict_proba_batch(self, features: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities for a feature matrix via the raw booster.
+        
+        Skips the sklearn wrapper's per-call validation; XGBoost releases the
+        GIL and spreads the rows over its own threads. Models without a booster
+        of their own (e.g. calibrated ones) fall back to predict_proba.
+        """
+        if self._booster is None:
+            return self.model.predict_proba(features)
+        
+        # Row-major float32 is what DMatrix ingests without conversion; this is a
+        # no-op for the extractor's own matrices and fixes up column-major input
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        dmatrix = xgb.DMatrix(features, nthread=-1)
+        return self._booster.predict(
+            dmatrix,
+            iteration_range=self._iteration_range,
+            validate_features=False
+        )
+    
     def predict(
         self,
         title: str,
         body: str,
         repo: str,
         threshold: float = 0.30
-    ) -> Dict:
+    ) -> Prediction:
         """Predict and return up to 3 tags with confidence."""
-        # Combine text
-        text = f"{title}\n{body}"
-        
-        # Extract features
+        # Extract features (cache hits never build the combined text)
+        features = self._cached_features(title, body, repo)
+        return self.get_recommendations(features=features, threshold=threshold)
+    
+    def _extract_features(self, title: str, body: str, repo: str) -> np.ndarray:
+        """Extract the feature row for one issue as a read-only array."""
+        # Combine text once; title and body are passed along so the extractor
+        # doesn't split (and copy) them back out of it
         features = self.feature_extractor.extract_all_features(
-            text=text,
+            text='\n'.join((title, body)),
             repo=repo,
-            repo_encoder=self.repo_encoder
+            repo_encoder=self.repo_encoder,
+            title=title,
+            body=body
         )
-        return self.get_recommendations(features=features, threshold=threshold)
+        features.flags.writeable = False
+        return features
     
     def batch_predict(
         self,
         issues: List[Dict[str, str]],
-        threshold: float = 0.30
-    ) -> List[Dict]:
+        threshold: float = 0.30,
+        n_jobs: int = 1
+    ) -> List[Prediction]:
         """Predict categories for multiple issues."""
+        return list(self.batch_predict_iter(issues, threshold=threshold, n_jobs=n_jobs))
+    
+    def batch_predict_iter(
+        self,
+        issues: Iterable[Dict[str, str]],
+        threshold: float = 0.30,
+        chunk_size: int = 1024,
+        n_jobs: int = 1
+    ) -> Iterator[Prediction]:
+        """
+        Lazily predict categories for a stream of issues.
+        
+        Issues are scored chunk_size at a time, so peak memory is bounded by
+        the chunk rather than the whole input, and results are yielded as soon
+        as their chunk is done.
+        
+        With n_jobs != 1, chunks are processed concurrently on a joblib thread
+        pool (results still come back in input order). The heavy steps (BERT
+        encoding, XGBoost scoring) release the GIL, so one chunk's scoring
+        overlaps the next chunk's featurization.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+        
+        issues = iter(issues)
+        chunks = iter(lambda: list(islice(issues, chunk_size)), [])
+        if n_jobs == 1:
+            for chunk in chunks:
+                yield from self._predict_chunk(chunk, threshold=threshold)
+            return
+        
+        results = Parallel(n_jobs=n_jobs, prefer='threads', return_as='generator')(
+            delayed(self._predict_chunk)(chunk, threshold=threshold) for chunk in chunks
+        )
+        for chunk_results in results:
+            yield from chunk_results
+    
+    def _predict_chunk(
+        self,
+        issues: List[Dict[str, str]],
+        threshold: float = 0.30
+    ) -> List[Prediction]:
+        """
+        Predict categories for one chunk of issues.
+        
+        Features for all issues are stacked into one matrix so the booster
+        scores the whole chunk in a single call.
+        """
+        titles = [issue['title'] for issue in issues]
+        bodies = [issue['body'] for issue in issues]
+        features = self.feature_extractor.extract_all_features_batch(
+            texts=['\n'.join(parts) for parts in zip(titles, bodies)],
+            repos=[issue['repo'] for issue in issues],
+            repo_encoder=self.repo_encoder,
+            titles=titles,
+            bodies=bodies
+        )
+        probas = self._predict_proba_batch(features)
+        top_idx = self._top_k(probas)
         return [
-            self.predict(
-                title=issue['title'],
-                body=issue['body'],
-                repo=issue['repo'],
-                threshold=threshold
-            )
-            for issue in issues
+            self._build_result(proba, row_top_idx, threshold=threshold)
+            for proba, row_top_idx in zip(probas, top_idx)
         ]
\ No newline at end of file